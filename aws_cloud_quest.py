@@ -5,7 +5,14 @@ import json
 import time
 import os
 import math
+import re
 from pygame.locals import *
+from question_card import QuestionCardCache
+from hit_test import HitTestIndex
+from matchmaking import Matchmaker
+from spectator import SpectatorHub
+from session_snapshot import SessionState, SnapshotWriter, load_session
+from low_memory import compact_questions, shared_surface
 
 # Initialize pygame
 pygame.init()
@@ -28,6 +35,11 @@ ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
 if not os.path.exists(ASSETS_DIR):
     os.makedirs(ASSETS_DIR)
 
+# Saved mid-game sessions, one file per kiosk, used to resume after a crash or restart
+SNAPSHOT_PATH = os.path.join(ASSETS_DIR, "session-{kiosk_id}.snapshot")
+# Kiosk ids become part of a file name, so they may not contain path separators
+KIOSK_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
 # Game states
 MENU = 0
 GAME_MODE = 1
@@ -40,8 +52,8 @@ CREDITS = 6
 # Import custom modules
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets"))
 try:
-    from assets.aws_logo import create_aws_logo
-    from assets.particles import ParticleSystem
+    from aws_logo import create_aws_logo
+    from particles import ParticleSystem
 except ImportError:
     # Fallback if imports fail
     def create_aws_logo(width=200, height=100):
@@ -50,7 +62,7 @@ except ImportError:
         return logo
     
     class ParticleSystem:
-        def __init__(self):
+        def __init__(self, max_particles=None, flat_confetti=False):
             self.active = False
         def start_celebration(self, width, height):
             self.active = True
@@ -60,13 +72,19 @@ except ImportError:
             pass
 
 class Button:
+    __slots__ = ("rect", "text", "color", "hover_color", "current_color")
+    
+    # One font object shared by every button
+    font = None
+    
     def __init__(self, x, y, width, height, text, color, hover_color):
         self.rect = pygame.Rect(x, y, width, height)
         self.text = text
         self.color = color
         self.hover_color = hover_color
         self.current_color = color
-        self.font = pygame.font.SysFont('Arial', 24)
+        if Button.font is None:
+            Button.font = pygame.font.SysFont('Arial', 24)
         
     def draw(self, screen):
         pygame.draw.rect(screen, self.current_color, self.rect, border_radius=10)
@@ -75,21 +93,23 @@ class Button:
         text_rect = text_surface.get_rect(center=self.rect.center)
         screen.blit(text_surface, text_rect)
         
-    def is_hovered(self, pos):
-        if self.rect.collidepoint(pos):
-            self.current_color = self.hover_color
-            return True
+    def on_enter(self):
+        self.current_color = self.hover_color
+        
+    def on_leave(self):
         self.current_color = self.color
-        return False
 
 class AWSCloudQuest:
-    def __init__(self):
+    def __init__(self, low_memory=False, kiosk_id="default"):
+        if not KIOSK_ID_PATTERN.fullmatch(kiosk_id):
+            raise ValueError(f"Invalid kiosk id {kiosk_id!r}: use letters, digits, '-' and '_'")
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("AWS Cloud Quest")
         self.clock = pygame.time.Clock()
         self.state = MENU
         self.player_name = ""
         self.game_code = ""
+        self.lobby_room = None
         self.difficulty = ""
         self.score = 0
         self.opponent_score = 0
@@ -101,25 +121,33 @@ class AWSCloudQuest:
         self.result_message = ""
         self.is_multiplayer = False
         self.input_active = False
+        self.low_memory = low_memory
         self.load_questions()
+        if low_memory:
+            self.all_questions = compact_questions(self.all_questions)
         
-        # Initialize particle system for celebrations
-        self.particle_system = ParticleSystem()
+        # Lobby for multiplayer rooms and game codes
+        self.matchmaker = Matchmaker()
         
-        # Load AWS cloud background image (placeholder)
-        self.background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.background.fill(LIGHT_BLUE)
-        
-        # Create cloud patterns in the background
-        for _ in range(15):
-            cloud_x = random.randint(0, SCREEN_WIDTH)
-            cloud_y = random.randint(0, SCREEN_HEIGHT)
-            cloud_size = random.randint(50, 150)
-            pygame.draw.ellipse(self.background, (255, 255, 255, 128), 
-                               (cloud_x, cloud_y, cloud_size, cloud_size//2), 0)
+        # Broadcasts the live match to spectators while a multiplayer game runs
+        self.spectator_hub = None
         
-        # Create AWS logo
-        self.logo = create_aws_logo(200, 100)
+        # Initialize particle system for celebrations
+        if low_memory:
+            self.particle_system = ParticleSystem(max_particles=60, flat_confetti=True)
+        else:
+            self.particle_system = ParticleSystem()
+        
+        # Background and logo never change, so in low-memory mode they are
+        # memory-mapped from asset files shared by every instance
+        if low_memory:
+            self.background = shared_surface(ASSETS_DIR, "background", (SCREEN_WIDTH, SCREEN_HEIGHT),
+                                             "RGB", self.create_background)
+            self.logo = shared_surface(ASSETS_DIR, "logo", (200, 100), "RGBA",
+                                       lambda: create_aws_logo(200, 100))
+        else:
+            self.background = self.create_background()
+            self.logo = create_aws_logo(200, 100)
         
         # Create buttons
         self.menu_buttons = [
@@ -150,12 +178,47 @@ class AWSCloudQuest:
             Button(SCREEN_WIDTH//2 - 150, 580, 300, 60, "Back", ORANGE, LIGHT_BLUE)
         ]
         
+        # Register each screen's clickable regions once
+        self.hit_regions = {}
+        for state, buttons in ((MENU, self.menu_buttons), (GAME_MODE, self.game_mode_buttons),
+                               (DIFFICULTY, self.difficulty_buttons), (RESULT, self.result_buttons),
+                               (CREDITS, self.credits_buttons)):
+            self.hit_regions[state] = HitTestIndex()
+            for i, button in enumerate(buttons):
+                self.hit_regions[state].add(button.rect, i, button)
+        
         # Fonts
         self.title_font = pygame.font.SysFont('Arial', 48, bold=True)
         self.subtitle_font = pygame.font.SysFont('Arial', 36)
         self.text_font = pygame.font.SysFont('Arial', 24)
         self.question_font = pygame.font.SysFont('Arial', 28)
         
+        # Cached question cards for the playing screen
+        self.card_cache = QuestionCardCache(self.subtitle_font, self.question_font, self.text_font,
+                                            SCREEN_WIDTH, self.background, prefetch=not low_memory)
+        
+        # Resume an unfinished game if a snapshot was left behind
+        # Each instance sharing a machine needs its own kiosk id
+        self.snapshot_path = SNAPSHOT_PATH.format(kiosk_id=kiosk_id)
+        self.snapshots = SnapshotWriter(self.snapshot_path)
+        session = load_session(self.snapshot_path)
+        if session:
+            self.resume_session(session)
+        
+    def create_background(self):
+        # Load AWS cloud background image (placeholder)
+        background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        background.fill(LIGHT_BLUE)
+        
+        # Create cloud patterns in the background
+        for _ in range(15):
+            cloud_x = random.randint(0, SCREEN_WIDTH)
+            cloud_y = random.randint(0, SCREEN_HEIGHT)
+            cloud_size = random.randint(50, 150)
+            pygame.draw.ellipse(background, (255, 255, 255, 128), 
+                               (cloud_x, cloud_y, cloud_size, cloud_size//2), 0)
+        return background
+        
     def load_questions(self):
         # Sample questions - in a real implementation, load from a JSON file
         self.all_questions = {
@@ -254,6 +317,8 @@ class AWSCloudQuest:
         self.current_question = 0
         self.score = 0
         self.opponent_score = 0
+        self.card_cache.clear()
+        self.card_cache.prefetch(self.questions, 0, difficulty)
         
     def draw_text_input(self, prompt, input_text):
         prompt_surface = self.subtitle_font.render(prompt, True, BLACK)
@@ -268,10 +333,63 @@ class AWSCloudQuest:
         input_rect = input_surface.get_rect(center=input_box.center)
         self.screen.blit(input_surface, input_rect)
         
+    def join_lobby(self):
+        # Join an open room for this difficulty, or open one and wait in it
+        self.lobby_room = self.matchmaker.quick_match(self.player_name or "Player", self.difficulty)
+        self.game_code = self.lobby_room.code
+        
+    def start_broadcast(self):
+        self.spectator_hub = SpectatorHub(self.game_code, self.difficulty, len(self.questions))
+        self.spectator_hub.set_scores(self.score, self.opponent_score)
+        self.publish_question()
+        # Spectators attach through the lobby with matchmaker.watch(game_code)
+        if self.lobby_room:
+            self.lobby_room.spectator_hub = self.spectator_hub
+        
+    def publish_question(self):
+        if self.spectator_hub and self.current_question < len(self.questions):
+            bank_index = self.all_questions[self.difficulty].index(self.questions[self.current_question])
+            self.spectator_hub.set_question(self.current_question, bank_index)
+            
+    def save_session(self):
+        # Questions are stored by their position in the question bank
+        bank = self.all_questions[self.difficulty]
+        self.snapshots.save(SessionState(
+            self.difficulty, self.is_multiplayer, self.current_question, self.score,
+            self.opponent_score, self.game_code if self.is_multiplayer else "",
+            [bank.index(question) for question in self.questions],
+        ))
+        
+    def resume_session(self, session):
+        # A snapshot can outlive edits to the question bank; drop it if it no longer fits
+        bank = self.all_questions.get(session.difficulty, [])
+        if (not session.question_order or session.current_question >= len(session.question_order)
+                or max(session.question_order) >= len(bank)
+                or (session.is_multiplayer and not session.game_code)):
+            self.snapshots.discard()
+            return
+        
+        self.difficulty = session.difficulty
+        self.is_multiplayer = session.is_multiplayer
+        self.questions = [bank[i] for i in session.question_order]
+        self.current_question = session.current_question
+        self.score = session.score
+        self.opponent_score = session.opponent_score
+        self.game_code = session.game_code
+        self.card_cache.clear()
+        if self.is_multiplayer:
+            self.lobby_room = self.matchmaker.restore_room(self.game_code, self.player_name or "Player",
+                                                           "Opponent", self.difficulty)
+            self.start_broadcast()
+        self.answer_time = time.time()
+        self.state = PLAYING
+            
     def simulate_opponent(self):
         # Simulate opponent answering questions (randomly)
         if random.random() > 0.3:  # 70% chance of correct answer
             self.opponent_score += 100 + random.randint(0, 50)  # Random bonus points
+        if self.spectator_hub:
+            self.spectator_hub.lock_answer(1, self.current_question)
             
     def draw_menu(self):
         # Draw title
@@ -324,7 +442,11 @@ class AWSCloudQuest:
         # In a real implementation, check for opponent connection
         # For demo, automatically connect after a few seconds
         if time.time() % 5 < 0.1:
+            self.matchmaker.join_room(self.game_code, "Opponent")
+            self.start_broadcast()
             self.state = PLAYING
+            self.answer_time = time.time()
+            self.save_session()
             
     def draw_playing(self):
         if self.current_question >= len(self.questions):
@@ -335,13 +457,20 @@ class AWSCloudQuest:
                 self.result_message = "You Lost. Try Again!"
             else:
                 self.result_message = "It's a Tie!"
+            self.card_cache.clear()
+            if self.lobby_room:
+                self.matchmaker.close_room(self.game_code, self.lobby_room)
+                self.lobby_room = None
+            if self.spectator_hub:
+                self.spectator_hub.close()
+                self.spectator_hub = None
+            self.snapshots.discard()
             return
             
-        # Draw question number and difficulty
-        header_text = f"Question {self.current_question + 1}/{len(self.questions)} - {self.difficulty}"
-        header_surface = self.subtitle_font.render(header_text, True, BLACK)
-        header_rect = header_surface.get_rect(topleft=(50, 50))
-        self.screen.blit(header_surface, header_rect)
+        # Draw the cached question card (header, question and options)
+        card = self.card_cache.get(self.questions, self.current_question, self.difficulty)
+        card.draw(self.screen, self.selected_answer)
+        self.card_cache.prefetch(self.questions, self.current_question + 1, self.difficulty)
         
         # Draw scores
         score_text = f"Your Score: {self.score}"
@@ -354,29 +483,6 @@ class AWSCloudQuest:
             opponent_surface = self.text_font.render(opponent_text, True, BLACK)
             opponent_rect = opponent_surface.get_rect(topright=(SCREEN_WIDTH - 50, 100))
             self.screen.blit(opponent_surface, opponent_rect)
-        
-        # Draw question
-        question = self.questions[self.current_question]["question"]
-        question_surface = self.question_font.render(question, True, BLACK)
-        question_rect = question_surface.get_rect(center=(SCREEN_WIDTH//2, 200))
-        self.screen.blit(question_surface, question_rect)
-        
-        # Draw options
-        options = self.questions[self.current_question]["options"]
-        for i, option in enumerate(options):
-            option_rect = pygame.Rect(SCREEN_WIDTH//2 - 300, 300 + i*80, 600, 60)
-            
-            # Highlight selected answer
-            if self.selected_answer == i:
-                pygame.draw.rect(self.screen, ORANGE, option_rect, border_radius=10)
-            else:
-                pygame.draw.rect(self.screen, WHITE, option_rect, border_radius=10)
-                
-            pygame.draw.rect(self.screen, BLACK, option_rect, 2, border_radius=10)
-            
-            option_surface = self.text_font.render(f"{chr(65+i)}. {option}", True, BLACK)
-            option_text_rect = option_surface.get_rect(midleft=(option_rect.left + 20, option_rect.centery))
-            self.screen.blit(option_surface, option_text_rect)
             
         # Draw timer (if implemented)
         # timer_text = f"Time: {30 - int(time.time() - self.answer_time)}"
@@ -444,103 +550,110 @@ class AWSCloudQuest:
             button.draw(self.screen)
             
     def handle_menu_click(self, pos):
-        for i, button in enumerate(self.menu_buttons):
-            if button.rect.collidepoint(pos):
-                if i == 0:  # Start Game
-                    self.state = GAME_MODE
-                elif i == 1:  # Credits
-                    self.state = CREDITS
-                elif i == 2:  # Quit
-                    pygame.quit()
-                    sys.exit()
-                    
+        i = self.hit_regions[MENU].hit(pos)
+        if i == 0:  # Start Game
+            self.state = GAME_MODE
+        elif i == 1:  # Credits
+            self.state = CREDITS
+        elif i == 2:  # Quit
+            self.snapshots.close()
+            pygame.quit()
+            sys.exit()
+            
     def handle_game_mode_click(self, pos):
-        for i, button in enumerate(self.game_mode_buttons):
-            if button.rect.collidepoint(pos):
-                if i == 0:  # Single Player
-                    self.is_multiplayer = False
-                    self.state = DIFFICULTY
-                elif i == 1:  # Multiplayer
-                    self.is_multiplayer = True
-                    self.state = DIFFICULTY
-                    # In a real implementation, handle player name input and game code generation
-                    self.game_code = "".join([str(random.randint(0, 9)) for _ in range(6)])
-                elif i == 2:  # Back
-                    self.state = MENU
-                    
+        i = self.hit_regions[GAME_MODE].hit(pos)
+        if i == 0:  # Single Player
+            self.is_multiplayer = False
+            self.state = DIFFICULTY
+        elif i == 1:  # Multiplayer
+            self.is_multiplayer = True
+            self.state = DIFFICULTY
+        elif i == 2:  # Back
+            self.state = MENU
+            
     def handle_difficulty_click(self, pos):
-        for i, button in enumerate(self.difficulty_buttons):
-            if button.rect.collidepoint(pos):
-                if i == 0:  # Beginner
-                    self.set_questions("Beginner")
-                    if self.is_multiplayer:
-                        self.state = WAITING
-                    else:
-                        self.state = PLAYING
-                        self.answer_time = time.time()
-                elif i == 1:  # Intermediate
-                    self.set_questions("Intermediate")
-                    if self.is_multiplayer:
-                        self.state = WAITING
-                    else:
-                        self.state = PLAYING
-                        self.answer_time = time.time()
-                elif i == 2:  # Hard
-                    self.set_questions("Hard")
-                    if self.is_multiplayer:
-                        self.state = WAITING
-                    else:
-                        self.state = PLAYING
-                        self.answer_time = time.time()
-                elif i == 3:  # Back
-                    self.state = GAME_MODE
-                    
-    def handle_playing_click(self, pos):
-        options = self.questions[self.current_question]["options"]
-        for i in range(len(options)):
-            option_rect = pygame.Rect(SCREEN_WIDTH//2 - 300, 300 + i*80, 600, 60)
-            if option_rect.collidepoint(pos):
-                self.selected_answer = i
-                correct_answer = self.questions[self.current_question]["answer"]
-                
-                # Calculate score based on correctness and time
-                if self.selected_answer == correct_answer:
-                    time_bonus = max(0, 50 - int(time.time() - self.answer_time))
-                    self.score += 100 + time_bonus
-                
-                # Simulate opponent answer
-                if self.is_multiplayer:
-                    self.simulate_opponent()
-                
-                # Move to next question after a short delay
-                pygame.time.delay(1000)  # 1 second delay to show the selected answer
-                self.current_question += 1
-                self.selected_answer = None
+        i = self.hit_regions[DIFFICULTY].hit(pos)
+        if i == 0:  # Beginner
+            self.set_questions("Beginner")
+            if self.is_multiplayer:
+                self.join_lobby()
+                self.state = WAITING
+            else:
+                self.state = PLAYING
                 self.answer_time = time.time()
-                break
-                
+                self.save_session()
+        elif i == 1:  # Intermediate
+            self.set_questions("Intermediate")
+            if self.is_multiplayer:
+                self.join_lobby()
+                self.state = WAITING
+            else:
+                self.state = PLAYING
+                self.answer_time = time.time()
+                self.save_session()
+        elif i == 2:  # Hard
+            self.set_questions("Hard")
+            if self.is_multiplayer:
+                self.join_lobby()
+                self.state = WAITING
+            else:
+                self.state = PLAYING
+                self.answer_time = time.time()
+                self.save_session()
+        elif i == 3:  # Back
+            self.state = GAME_MODE
+            
+    def handle_playing_click(self, pos):
+        card = self.card_cache.get(self.questions, self.current_question, self.difficulty)
+        i = card.option_at(pos)
+        if i is not None:
+            self.selected_answer = i
+            if self.spectator_hub:
+                self.spectator_hub.lock_answer(0, self.current_question)
+            correct_answer = self.questions[self.current_question]["answer"]
+            
+            # Calculate score based on correctness and time
+            if self.selected_answer == correct_answer:
+                time_bonus = max(0, 50 - int(time.time() - self.answer_time))
+                self.score += 100 + time_bonus
+            
+            # Simulate opponent answer and keep the room from expiring mid-match
+            if self.is_multiplayer:
+                self.simulate_opponent()
+                self.matchmaker.touch(self.game_code)
+            
+            # Move to next question after a short delay
+            pygame.time.delay(1000)  # 1 second delay to show the selected answer
+            self.current_question += 1
+            self.selected_answer = None
+            self.answer_time = time.time()
+            if self.spectator_hub:
+                self.spectator_hub.set_scores(self.score, self.opponent_score)
+                self.publish_question()
+            self.save_session()
+            
     def handle_result_click(self, pos):
-        for i, button in enumerate(self.result_buttons):
-            if button.rect.collidepoint(pos):
-                if i == 0:  # Play Again
-                    self.state = DIFFICULTY
-                elif i == 1:  # Main Menu
-                    self.state = MENU
-                    
+        i = self.hit_regions[RESULT].hit(pos)
+        if i == 0:  # Play Again
+            self.state = DIFFICULTY
+        elif i == 1:  # Main Menu
+            self.state = MENU
+            
     def handle_credits_click(self, pos):
-        for button in self.credits_buttons:
-            if button.rect.collidepoint(pos):
-                self.state = MENU
+        if self.hit_regions[CREDITS].hit(pos) is not None:
+            self.state = MENU
                 
     def run(self):
         running = True
+        hover_state = None
         while running:
-            mouse_pos = pygame.mouse.get_pos()
-            
             # Handle events
             for event in pygame.event.get():
                 if event.type == QUIT:
                     running = False
+                elif event.type == MOUSEMOTION:
+                    if self.state in self.hit_regions:
+                        self.hit_regions[self.state].update_hover(event.pos)
                 elif event.type == MOUSEBUTTONDOWN:
                     if self.state == MENU:
                         self.handle_menu_click(event.pos)
@@ -579,30 +692,37 @@ class AWSCloudQuest:
             elif self.state == CREDITS:
                 self.draw_credits()
                 
-            # Update button hover states
-            if self.state == MENU:
-                for button in self.menu_buttons:
-                    button.is_hovered(mouse_pos)
-            elif self.state == GAME_MODE:
-                for button in self.game_mode_buttons:
-                    button.is_hovered(mouse_pos)
-            elif self.state == DIFFICULTY:
-                for button in self.difficulty_buttons:
-                    button.is_hovered(mouse_pos)
-            elif self.state == RESULT:
-                for button in self.result_buttons:
-                    button.is_hovered(mouse_pos)
-            elif self.state == CREDITS:
-                for button in self.credits_buttons:
-                    button.is_hovered(mouse_pos)
+            # Reset hover state when switching screens
+            if self.state != hover_state:
+                if hover_state in self.hit_regions:
+                    self.hit_regions[hover_state].leave()
+                hover_state = self.state
+                if self.state in self.hit_regions:
+                    self.hit_regions[self.state].update_hover(pygame.mouse.get_pos())
                     
             # Update display
             pygame.display.flip()
+            
+            # Send this frame's coalesced updates to spectators
+            if self.spectator_hub:
+                self.spectator_hub.flush()
+                
+            # Drop lobby rooms that have been idle too long
+            self.matchmaker.expire()
+            
+            # Use the rest of the frame to pre-render upcoming question cards
+            self.card_cache.render_pending()
             self.clock.tick(60)
             
+        self.snapshots.close()
         pygame.quit()
         sys.exit()
 
 if __name__ == "__main__":
-    game = AWSCloudQuest()
+    kiosk_id = "default"
+    if "--kiosk" in sys.argv[:-1]:
+        kiosk_id = sys.argv[sys.argv.index("--kiosk") + 1]
+        if not KIOSK_ID_PATTERN.fullmatch(kiosk_id):
+            sys.exit(f"Invalid kiosk id {kiosk_id!r}: use letters, digits, '-' and '_'")
+    game = AWSCloudQuest(low_memory="--low-memory" in sys.argv, kiosk_id=kiosk_id)
     game.run()
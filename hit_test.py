@@ -0,0 +1,54 @@
+"""
+This file contains a hit-test index for clickable screen regions.
+Each screen registers its regions once; clicks and mouse motion are resolved
+through a uniform grid so lookups stay cheap on screens with many entries.
+"""
+
+import pygame
+
+
+class HitTestIndex:
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.hovered = None
+
+    def add(self, rect, key, listener=None):
+        """Register a region; listener gets on_enter/on_leave calls when hovered"""
+        rect = pygame.Rect(rect)
+        region = (rect, key, listener)
+        for cell in self._cells_for(rect):
+            self.cells.setdefault(cell, []).append(region)
+
+    def _cells_for(self, rect):
+        size = self.cell_size
+        for cx in range(rect.left // size, (rect.right - 1) // size + 1):
+            for cy in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                yield (cx, cy)
+
+    def _region_at(self, pos):
+        cell = (pos[0] // self.cell_size, pos[1] // self.cell_size)
+        # Regions registered later are drawn on top, so they win overlaps
+        for region in reversed(self.cells.get(cell, ())):
+            if region[0].collidepoint(pos):
+                return region
+        return None
+
+    def hit(self, pos):
+        region = self._region_at(pos)
+        return region[1] if region else None
+
+    def update_hover(self, pos):
+        """Fire enter/leave events if the hovered region changed"""
+        region = self._region_at(pos)
+        if region is self.hovered:
+            return
+        self.leave()
+        self.hovered = region
+        if region and region[2]:
+            region[2].on_enter()
+
+    def leave(self):
+        if self.hovered and self.hovered[2]:
+            self.hovered[2].on_leave()
+        self.hovered = None
@@ -0,0 +1,174 @@
+"""
+This file contains helpers for the low-memory mode used when many kiosk
+sessions share one machine. Immutable surfaces are stored as raw pixel files
+and memory-mapped, so every instance and every process reads the same pages,
+questions are stored in compact slotted records and only the current
+question card is kept.
+"""
+
+import mmap
+import os
+import subprocess
+import sys
+
+import pygame
+
+_image_to_bytes = getattr(pygame.image, "tobytes", None) or pygame.image.tostring
+
+# Surfaces already mapped in this process, shared by every game instance
+_shared_surfaces = {}
+
+
+def shared_surface(directory, name, size, pixel_format, render):
+    """Return a read-only surface backed by a memory-mapped asset file.
+
+    The file is rendered once with render() and reused afterwards. The returned
+    surface must only be blitted from, never drawn onto.
+    """
+    width, height = size
+    path = os.path.join(directory, f"{name}_{width}x{height}.{pixel_format.lower()}")
+    if path in _shared_surfaces:
+        return _shared_surfaces[path]
+
+    expected_size = width * height * len(pixel_format)
+    if not os.path.exists(path) or os.path.getsize(path) != expected_size:
+        data = _image_to_bytes(render(), pixel_format)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # frombuffer keeps a reference to the mapping, so it stays open with the surface
+    surface = pygame.image.frombuffer(mapped, size, pixel_format)
+    _shared_surfaces[path] = surface
+    return surface
+
+
+class Question:
+    """Compact question record that still supports question["options"] lookups"""
+
+    __slots__ = ("question", "options", "answer")
+
+    def __init__(self, question, options, answer):
+        self.question = sys.intern(question)
+        self.options = tuple(sys.intern(option) for option in options)
+        self.answer = answer
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+def compact_questions(all_questions):
+    return {
+        difficulty: [Question(q["question"], q["options"], q["answer"]) for q in questions]
+        for difficulty, questions in all_questions.items()
+    }
+
+
+SMAPS_ROLLUP = "/proc/self/smaps_rollup"
+
+
+def memory_usage():
+    """Return the current (rss, pss) in bytes for this process.
+
+    Both are None where /proc/self/smaps_rollup is missing (e.g. macOS or older
+    kernels); the peak RSS from getrusage is not a substitute for current usage.
+    """
+    rss = pss = None
+    try:
+        with open(SMAPS_ROLLUP) as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("Pss:"):
+                    pss = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return rss, pss
+
+
+def _measure(instances, low_memory):
+    """Print per-instance memory for idle and playing instances (run in a subprocess)"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    from aws_cloud_quest import AWSCloudQuest, PLAYING
+
+    def create(i):
+        game = AWSCloudQuest(low_memory=low_memory, kiosk_id=f"memory-benchmark-{i}")
+        game.snapshots.close()
+        return game
+
+    def per_instance(before, after):
+        if before is None or after is None:
+            return -1
+        return (after - before) / instances / 1024
+
+    # The first instance pays for one-off costs such as fonts and shared assets
+    games = [create(0)]
+    start = memory_usage()
+    games += [create(i) for i in range(1, instances + 1)]
+    idle = memory_usage()
+
+    # Mid-game: question cards are cached (and prefetched outside low-memory
+    # mode) and a celebration runs
+    for game in games[1:]:
+        game.set_questions("Hard")
+        game.state = PLAYING
+        game.draw_playing()
+        game.card_cache.render_pending()
+        game.particle_system.start_celebration(1024, 768)
+    playing = memory_usage()
+
+    print(" ".join(f"{value:.0f}" for value in (
+        per_instance(start[0], idle[0]), per_instance(start[1], idle[1]),
+        per_instance(start[0], playing[0]), per_instance(start[1], playing[1]),
+    )))
+
+
+def measure(instances=8):
+    """Return {low_memory: [RSS idle, PSS idle, RSS playing, PSS playing]} in KiB per instance.
+
+    Each mode runs in a fresh process so one mode's allocations do not hide the
+    other's. Values are -1 where the measurement is unavailable.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for low_memory in (False, True):
+        output = subprocess.run(
+            [sys.executable, "-c",
+             f"import low_memory; low_memory._measure({instances}, {low_memory})"],
+            cwd=here, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        results[low_memory] = [float(value) for value in output[-4:]]
+    return results
+
+
+def benchmark(instances=8, max_ratio=0.5):
+    """Compare memory per game instance with and without low-memory mode.
+
+    Fails if low-memory mode does not use at most max_ratio of the default
+    mode's RSS and PSS per instance, idle and mid-game.
+    """
+    if not os.path.exists(SMAPS_ROLLUP):
+        print(f"{SMAPS_ROLLUP} is not available, skipping the memory comparison")
+        return
+
+    results = measure(instances)
+    columns = ("RSS idle", "PSS idle", "RSS playing", "PSS playing")
+    print(f"{'KiB/instance':<14}" + "".join(f"{column:>13}" for column in columns))
+    for low_memory, values in results.items():
+        name = "low-memory" if low_memory else "default"
+        print(f"{name:<14}" + "".join(f"{value:>13.0f}" for value in values))
+
+    failures = [
+        column for column, default, low in zip(columns, results[False], results[True])
+        if default >= 0 and low >= 0 and low > default * max_ratio
+    ]
+    if failures:
+        raise SystemExit(f"low-memory mode is not below {max_ratio:.0%} of default for: {', '.join(failures)}")
+    print(f"low-memory mode is below {max_ratio:.0%} of default for every measurement")
+
+
+if __name__ == "__main__":
+    benchmark()
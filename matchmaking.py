@@ -0,0 +1,256 @@
+"""
+This file contains the lobby and matchmaking service for multiplayer games.
+Game codes come from a bitmap-backed pool so they never collide, open rooms are
+kept in a hash index by code, quick-match queues are kept per difficulty and
+idle rooms are expired with a timing wheel.
+"""
+
+import random
+import time
+from collections import deque
+
+CODE_DIGITS = 6
+CODE_SPACE = 10 ** CODE_DIGITS
+
+
+class CodePool:
+    def __init__(self, size=CODE_SPACE):
+        self.size = size
+        self.used = bytearray((size + 7) // 8)
+        self.count = 0
+
+    def allocate(self):
+        if self.count >= self.size:
+            raise RuntimeError("No free game codes left")
+
+        # Random probing is O(1) on average while the pool is less than half full
+        for _ in range(32):
+            code = random.randrange(self.size)
+            if not self.used[code >> 3] & (1 << (code & 7)):
+                break
+        else:
+            # Fall back to scanning for a byte with a free bit
+            start = random.randrange(len(self.used))
+            for offset in range(len(self.used)):
+                byte_index = (start + offset) % len(self.used)
+                if self.used[byte_index] != 0xFF:
+                    bits = self.used[byte_index]
+                    code = byte_index * 8 + ((~bits & (bits + 1)).bit_length() - 1)
+                    if code < self.size:
+                        break
+
+        self.used[code >> 3] |= 1 << (code & 7)
+        self.count += 1
+        return code
+
+    def reserve(self, code):
+        """Mark a specific code as used, e.g. for a room moved from another process"""
+        if self.used[code >> 3] & (1 << (code & 7)):
+            return False
+        self.used[code >> 3] |= 1 << (code & 7)
+        self.count += 1
+        return True
+
+    def release(self, code):
+        if self.used[code >> 3] & (1 << (code & 7)):
+            self.used[code >> 3] &= ~(1 << (code & 7)) & 0xFF
+            self.count -= 1
+
+
+class Room:
+    __slots__ = ("code", "difficulty", "host", "guest", "quick", "deadline", "slot", "spectator_hub")
+
+    def __init__(self, code, difficulty, host, quick, deadline):
+        self.code = code
+        self.difficulty = difficulty
+        self.host = host
+        self.guest = None
+        self.quick = quick
+        self.deadline = deadline
+        self.slot = None
+        self.spectator_hub = None
+
+    def is_full(self):
+        return self.guest is not None
+
+
+class TimingWheel:
+    def __init__(self, slots, resolution, now):
+        self.resolution = resolution
+        self.slots = [set() for _ in range(slots)]
+        self.current_tick = int(now / resolution)
+
+    def schedule(self, room):
+        # Deadlines past the end of the wheel land in its last slot and are
+        # rescheduled when that slot comes due
+        tick = int(room.deadline / self.resolution)
+        tick = min(max(tick, self.current_tick + 1), self.current_tick + len(self.slots) - 1)
+        room.slot = tick % len(self.slots)
+        self.slots[room.slot].add(room.code)
+
+    def cancel(self, room):
+        if room.slot is not None:
+            self.slots[room.slot].discard(room.code)
+            room.slot = None
+
+    def advance(self, now):
+        """Return codes whose slots have come due up to now"""
+        due = []
+        target = int(now / self.resolution)
+        # Never walk more than one full turn of the wheel
+        steps = min(target - self.current_tick, len(self.slots))
+        for step in range(1, steps + 1):
+            slot = self.slots[(self.current_tick + step) % len(self.slots)]
+            due.extend(slot)
+            slot.clear()
+        self.current_tick = max(self.current_tick, target)
+        return due
+
+
+class Matchmaker:
+    def __init__(self, room_ttl=120, resolution=1.0, clock=time.monotonic):
+        self.room_ttl = room_ttl
+        self.clock = clock
+        self.codes = CodePool()
+        self.rooms = {}
+        self.queues = {}
+        self.wheel = TimingWheel(int(room_ttl / resolution) + 2, resolution, clock())
+
+    def format_code(self, code):
+        return str(code).zfill(CODE_DIGITS)
+
+    def create_room(self, host, difficulty, quick=False):
+        code = self.format_code(self.codes.allocate())
+        room = Room(code, difficulty, host, quick, self.clock() + self.room_ttl)
+        self.rooms[code] = room
+        self.wheel.schedule(room)
+        if quick:
+            self.queues.setdefault(difficulty, deque()).append(room)
+        return room
+
+    def restore_room(self, code, host, guest, difficulty):
+        """Re-register a room that was started elsewhere under its existing code"""
+        if not self.codes.reserve(int(code)):
+            return None
+        room = Room(code, difficulty, host, False, self.clock() + self.room_ttl)
+        room.guest = guest
+        self.rooms[code] = room
+        self.wheel.schedule(room)
+        return room
+
+    def get_room(self, code):
+        return self.rooms.get(code)
+
+    def watch(self, code, max_pending=8):
+        """Subscribe a spectator to a running match; None if it is not broadcasting"""
+        room = self.rooms.get(code)
+        if room is None or room.spectator_hub is None:
+            return None
+        return room.spectator_hub.subscribe(max_pending)
+
+    def join_room(self, code, guest):
+        room = self.rooms.get(code)
+        if room is None or room.is_full():
+            return None
+        room.guest = guest
+        self.touch(code)
+        return room
+
+    def quick_match(self, player, difficulty):
+        """Join the oldest open quick-match room for the difficulty, or open one"""
+        queue = self.queues.get(difficulty)
+        while queue:
+            room = queue.popleft()
+            # Closed or already joined rooms are skipped lazily; the identity check
+            # also skips rooms whose code was released and handed out again
+            if self.rooms.get(room.code) is room and not room.is_full():
+                room.guest = player
+                self.touch(room.code)
+                return room
+        return self.create_room(player, difficulty, quick=True)
+
+    def touch(self, code):
+        room = self.rooms.get(code)
+        if room is not None:
+            self.wheel.cancel(room)
+            room.deadline = self.clock() + self.room_ttl
+            self.wheel.schedule(room)
+
+    def close_room(self, code, room=None):
+        """Close the room with this code; if room is given, only if it still owns the code"""
+        if room is not None and self.rooms.get(code) is not room:
+            return
+        room = self.rooms.pop(code, None)
+        if room is not None:
+            self.wheel.cancel(room)
+            self.codes.release(int(code))
+
+    def expire(self):
+        now = self.clock()
+        expired = []
+        for code in self.wheel.advance(now):
+            room = self.rooms.get(code)
+            if room is None:
+                continue
+            room.slot = None
+            if room.deadline <= now:
+                self.close_room(code)
+                expired.append(code)
+            else:
+                self.wheel.schedule(room)
+        return expired
+
+
+def benchmark(players=100_000):
+    """Measure join latency and memory with many players waiting in one process"""
+    import tracemalloc
+
+    difficulties = ["Beginner", "Intermediate", "Hard"]
+
+    def report(name, samples):
+        samples.sort()
+        p50 = samples[len(samples) // 2] * 1e6
+        p99 = samples[int(len(samples) * 0.99)] * 1e6
+        print(f"{name:<12} p50 {p50:6.2f} us   p99 {p99:6.2f} us")
+
+    # Every player opens a private room, so all of them end up waiting
+    matchmaker = Matchmaker()
+    create_latencies = []
+    for i in range(players):
+        start = time.perf_counter()
+        matchmaker.create_room(f"player{i}", difficulties[i % 3])
+        create_latencies.append(time.perf_counter() - start)
+
+    codes = list(matchmaker.rooms)
+    random.shuffle(codes)
+    join_latencies = []
+    for i, code in enumerate(codes):
+        start = time.perf_counter()
+        matchmaker.join_room(code, f"guest{i}")
+        join_latencies.append(time.perf_counter() - start)
+
+    # Half of the quick-match players open a room, the other half join one
+    quick_latencies = []
+    for i in range(players):
+        start = time.perf_counter()
+        matchmaker.quick_match(f"quick{i}", difficulties[i % 3])
+        quick_latencies.append(time.perf_counter() - start)
+
+    print(f"{players} players")
+    report("create", create_latencies)
+    report("join", join_latencies)
+    report("quick match", quick_latencies)
+
+    # Memory is measured on a fresh lobby so the latency lists are not counted
+    tracemalloc.start()
+    matchmaker = Matchmaker()
+    for i in range(players):
+        matchmaker.create_room(f"player{i}", difficulties[i % 3])
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"memory with {players} waiting rooms: {current / 1024 / 1024:.1f} MiB "
+          f"({current / players:.0f} bytes per room)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -7,6 +7,8 @@ import random
 import math
 
 class Particle:
+    __slots__ = ("x", "y", "color", "size", "velocity_x", "velocity_y", "lifetime", "age")
+    
     def __init__(self, x, y, color, size, velocity_x, velocity_y, lifetime):
         self.x = x
         self.y = y
@@ -28,7 +30,10 @@ class Particle:
         pygame.draw.circle(surface, (*self.color, alpha), (int(self.x), int(self.y)), self.size)
 
 class Confetti:
-    def __init__(self, x, y, color, size, velocity_x, velocity_y, lifetime):
+    __slots__ = ("x", "y", "color", "size", "velocity_x", "velocity_y", "lifetime", "age",
+                 "rotation", "rotation_speed", "flat")
+    
+    def __init__(self, x, y, color, size, velocity_x, velocity_y, lifetime, flat=False):
         self.x = x
         self.y = y
         self.color = color
@@ -39,6 +44,7 @@ class Confetti:
         self.age = 0
         self.rotation = random.uniform(0, 360)
         self.rotation_speed = random.uniform(-5, 5)
+        self.flat = flat
         
     def update(self):
         self.x += self.velocity_x
@@ -49,6 +55,17 @@ class Confetti:
         return self.age < self.lifetime
         
     def draw(self, surface):
+        if self.flat:
+            # Draw the rotated square directly, without temporary surfaces
+            angle = math.radians(self.rotation)
+            half = self.size / 2
+            corners = []
+            for dx, dy in ((-half, -half), (half, -half), (half, half), (-half, half)):
+                corners.append((self.x + dx * math.cos(angle) - dy * math.sin(angle),
+                                self.y + dx * math.sin(angle) + dy * math.cos(angle)))
+            pygame.draw.polygon(surface, self.color, corners)
+            return
+            
         alpha = 255 * (1 - self.age / self.lifetime)
         rect = pygame.Rect(0, 0, self.size, self.size)
         rect.center = (self.x, self.y)
@@ -66,6 +83,9 @@ class Confetti:
         surface.blit(rotated_surface, rotated_rect)
 
 class Balloon:
+    __slots__ = ("x", "y", "color", "size", "velocity_y", "velocity_x", "lifetime", "age",
+                 "wobble", "wobble_speed", "wobble_amount")
+    
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -107,16 +127,24 @@ class Balloon:
                          (self.x, self.y + self.size + 40), 2)
 
 class ParticleSystem:
-    def __init__(self):
+    def __init__(self, max_particles=None, flat_confetti=False):
         self.particles = []
         self.active = False
+        self.max_particles = max_particles
+        self.flat_confetti = flat_confetti
         
     def start_celebration(self, screen_width, screen_height):
         self.active = True
         self.particles = []
         
+        # Scale every kind of particle down evenly when capped
+        counts = (100, 20, 50)
+        if self.max_particles is not None and self.max_particles < sum(counts):
+            counts = tuple(count * self.max_particles // sum(counts) for count in counts)
+        confetti_count, balloon_count, glitter_count = counts
+        
         # Add confetti
-        for _ in range(100):
+        for _ in range(confetti_count):
             x = random.randint(0, screen_width)
             y = random.randint(0, screen_height // 2)
             color = (
@@ -128,16 +156,17 @@ class ParticleSystem:
             velocity_x = random.uniform(-2, 2)
             velocity_y = random.uniform(1, 5)
             lifetime = random.randint(120, 240)  # 2-4 seconds at 60 FPS
-            self.particles.append(Confetti(x, y, color, size, velocity_x, velocity_y, lifetime))
+            self.particles.append(Confetti(x, y, color, size, velocity_x, velocity_y, lifetime,
+                                           self.flat_confetti))
         
         # Add balloons
-        for _ in range(20):
+        for _ in range(balloon_count):
             x = random.randint(0, screen_width)
             y = screen_height + random.randint(10, 50)
             self.particles.append(Balloon(x, y))
         
         # Add glitter particles
-        for _ in range(50):
+        for _ in range(glitter_count):
             x = random.randint(0, screen_width)
             y = random.randint(0, screen_height)
             color = (
@@ -0,0 +1,197 @@
+"""
+This file contains the binary wire protocol for multiplayer messages.
+Each message is a frame with a one byte type tag and a two byte payload length,
+followed by a struct-packed payload. Several frames can be batched into one
+packet, and packets are parsed in place through a memoryview.
+"""
+
+import json
+import struct
+import time
+from collections import namedtuple
+
+from matchmaking import CODE_DIGITS
+
+DIFFICULTIES = ("Beginner", "Intermediate", "Hard")
+
+# Message type tags
+CREATE_ROOM = 1
+JOIN_ROOM = 2
+ROOM_READY = 3
+LEAVE_ROOM = 4
+ROOM_CLOSED = 5
+ANSWER = 6
+SCORE = 7
+QUESTION = 8
+ANSWER_LOCKED = 9
+
+CreateRoom = namedtuple("CreateRoom", "difficulty player")
+JoinRoom = namedtuple("JoinRoom", "code player")
+RoomReady = namedtuple("RoomReady", "code difficulty questions")
+LeaveRoom = namedtuple("LeaveRoom", "code")
+RoomClosed = namedtuple("RoomClosed", "code")
+Answer = namedtuple("Answer", "code question option elapsed_ms")
+Score = namedtuple("Score", "code score opponent_score")
+Question = namedtuple("Question", "code number total bank_index")
+AnswerLocked = namedtuple("AnswerLocked", "code player question")
+
+HEADER = struct.Struct("<BH")
+MAX_PAYLOAD = 0xFFFF
+
+# Fixed part of each payload; player names follow as UTF-8 bytes
+PAYLOADS = {
+    CREATE_ROOM: (CreateRoom, struct.Struct("<B")),
+    JOIN_ROOM: (JoinRoom, struct.Struct("<I")),
+    ROOM_READY: (RoomReady, struct.Struct("<IBB")),
+    LEAVE_ROOM: (LeaveRoom, struct.Struct("<I")),
+    ROOM_CLOSED: (RoomClosed, struct.Struct("<I")),
+    ANSWER: (Answer, struct.Struct("<IBBH")),
+    SCORE: (Score, struct.Struct("<III")),
+    QUESTION: (Question, struct.Struct("<IBBB")),
+    ANSWER_LOCKED: (AnswerLocked, struct.Struct("<IBB")),
+}
+TAGS = {message_class: tag for tag, (message_class, _) in PAYLOADS.items()}
+
+
+def _fields(message):
+    """Return the fixed payload fields and trailing bytes for a message"""
+    tag = TAGS[type(message)]
+    if tag == CREATE_ROOM:
+        return tag, (DIFFICULTIES.index(message.difficulty),), message.player.encode("utf-8")
+    if tag == JOIN_ROOM:
+        return tag, (int(message.code),), message.player.encode("utf-8")
+    if tag == ROOM_READY:
+        return tag, (int(message.code), DIFFICULTIES.index(message.difficulty), message.questions), b""
+    if tag == ANSWER:
+        return tag, (int(message.code), message.question, message.option, min(message.elapsed_ms, 0xFFFF)), b""
+    return tag, (int(message.code), *message[1:]), b""
+
+
+def encoded_size(message):
+    tag, _, tail = _fields(message)
+    return HEADER.size + PAYLOADS[tag][1].size + len(tail)
+
+
+def encode_into(buffer, offset, message):
+    """Pack one frame into buffer at offset and return the offset after it"""
+    tag, values, tail = _fields(message)
+    payload = PAYLOADS[tag][1]
+    length = payload.size + len(tail)
+    if length > MAX_PAYLOAD:
+        raise ValueError("Message payload is too large")
+    HEADER.pack_into(buffer, offset, tag, length)
+    offset += HEADER.size
+    payload.pack_into(buffer, offset, *values)
+    offset += payload.size
+    buffer[offset:offset + len(tail)] = tail
+    return offset + len(tail)
+
+
+def encode(message):
+    buffer = bytearray(encoded_size(message))
+    encode_into(buffer, 0, message)
+    return bytes(buffer)
+
+
+def encode_batch(messages):
+    """Pack several messages into a single packet"""
+    buffer = bytearray(sum(encoded_size(message) for message in messages))
+    offset = 0
+    for message in messages:
+        offset = encode_into(buffer, offset, message)
+    return bytes(buffer)
+
+
+def _code(value):
+    return str(value).zfill(CODE_DIGITS)
+
+
+def _difficulty(value):
+    if value >= len(DIFFICULTIES):
+        raise ValueError(f"Unknown difficulty {value}")
+    return DIFFICULTIES[value]
+
+
+def decode(packet):
+    """Yield each message in a packet without copying the packet"""
+    view = memoryview(packet)
+    offset = 0
+    while offset < len(view):
+        if offset + HEADER.size > len(view):
+            raise ValueError("Truncated frame header")
+        tag, length = HEADER.unpack_from(view, offset)
+        offset += HEADER.size
+        end = offset + length
+        if tag not in PAYLOADS:
+            raise ValueError(f"Unknown message type {tag}")
+        message_class, payload = PAYLOADS[tag]
+        if end > len(view) or length < payload.size:
+            raise ValueError("Truncated frame payload")
+
+        values = payload.unpack_from(view, offset)
+        if tag == CREATE_ROOM:
+            yield CreateRoom(_difficulty(values[0]), str(view[offset + payload.size:end], "utf-8"))
+        elif tag == JOIN_ROOM:
+            yield JoinRoom(_code(values[0]), str(view[offset + payload.size:end], "utf-8"))
+        elif tag == ROOM_READY:
+            yield RoomReady(_code(values[0]), _difficulty(values[1]), values[2])
+        else:
+            yield message_class(_code(values[0]), *values[1:])
+        offset = end
+
+
+def benchmark(rounds=20_000):
+    """Compare encode/decode throughput and size against JSON"""
+    messages = [
+        CreateRoom("Hard", "Rohan"),
+        JoinRoom("042137", "Opponent"),
+        RoomReady("042137", "Hard", 5),
+        Answer("042137", 0, 2, 3150),
+        Score("042137", 148, 112),
+        Answer("042137", 1, 1, 4020),
+        Score("042137", 295, 250),
+        LeaveRoom("042137"),
+        RoomClosed("042137"),
+    ]
+    count = rounds * len(messages)
+
+    def as_json(message):
+        return json.dumps({"type": type(message).__name__, **message._asdict()},
+                          separators=(",", ":")).encode("utf-8")
+
+    def from_json(data):
+        fields = json.loads(data)
+        return globals()[fields.pop("type")](**fields)
+
+    binary_packets = [encode(message) for message in messages]
+    json_packets = [as_json(message) for message in messages]
+    batch_packet = encode_batch(messages)
+    assert [next(decode(packet)) for packet in binary_packets] == messages
+    assert [from_json(packet) for packet in json_packets] == messages
+    assert list(decode(batch_packet)) == messages
+
+    def throughput(fn):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        return count / (time.perf_counter() - start)
+
+    results = [
+        ("binary", sum(map(len, binary_packets)) / len(messages),
+         throughput(lambda: [encode(message) for message in messages]),
+         throughput(lambda: [next(decode(packet)) for packet in binary_packets])),
+        ("binary batch", len(batch_packet) / len(messages),
+         throughput(lambda: encode_batch(messages)),
+         throughput(lambda: list(decode(batch_packet)))),
+        ("json", sum(map(len, json_packets)) / len(messages),
+         throughput(lambda: [as_json(message) for message in messages]),
+         throughput(lambda: [from_json(packet) for packet in json_packets])),
+    ]
+
+    print(f"{'codec':<14}{'bytes/msg':>10}{'encode msg/s':>15}{'decode msg/s':>15}")
+    for name, size, encode_rate, decode_rate in results:
+        print(f"{name:<14}{size:>10.1f}{encode_rate:>15,.0f}{decode_rate:>15,.0f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,160 @@
+"""
+This file contains the question card renderer used on the playing screen.
+A card is laid out once per question (with word wrapping) into small cached
+pieces: text surfaces for the header and question, and opaque option tiles
+composited over the background. The next question's card is rendered during
+idle frame time.
+"""
+
+import pygame
+from hit_test import HitTestIndex
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+ORANGE = (255, 153, 0)
+
+
+def wrap_text(font, text, max_width):
+    """Split text into lines that fit within max_width pixels"""
+    lines = []
+    line = ""
+    for word in text.split():
+        # Break words that are too long to fit on a line by themselves
+        while font.size(word)[0] > max_width and len(word) > 1:
+            cut = len(word) - 1
+            while cut > 1 and font.size(word[:cut])[0] > max_width:
+                cut -= 1
+            if line:
+                lines.append(line)
+                line = ""
+            lines.append(word[:cut])
+            word = word[cut:]
+
+        candidate = f"{line} {word}" if line else word
+        if font.size(candidate)[0] <= max_width:
+            line = candidate
+        else:
+            lines.append(line)
+            line = word
+    if line or not lines:
+        lines.append(line)
+    return lines
+
+
+def _prepare(surface):
+    # Match the display's pixel format so blits skip conversion, when there is one
+    if pygame.display.get_surface() is not None:
+        return surface.convert_alpha() if surface.get_flags() & pygame.SRCALPHA else surface.convert()
+    return surface
+
+
+class QuestionCard:
+    def __init__(self, pieces, option_rects, option_labels):
+        # (surface, position) pairs; option tiles are opaque, text pieces are
+        # only as large as the text they hold
+        self.pieces = pieces
+        self.option_rects = option_rects
+        self.option_labels = option_labels
+        self.hit_index = HitTestIndex()
+        for i, rect in enumerate(option_rects):
+            self.hit_index.add(rect, i)
+
+    def draw(self, screen, selected_answer=None):
+        screen.blits(self.pieces, doreturn=False)
+
+        # Only the selected option is drawn per frame, on top of the cached card
+        if selected_answer is not None:
+            rect = self.option_rects[selected_answer]
+            pygame.draw.rect(screen, ORANGE, rect, border_radius=10)
+            pygame.draw.rect(screen, BLACK, rect, 2, border_radius=10)
+            label_rect = self.option_labels[selected_answer].get_rect(midleft=(rect.left + 20, rect.centery))
+            screen.blit(self.option_labels[selected_answer], label_rect)
+
+    def option_at(self, pos):
+        return self.hit_index.hit(pos)
+
+
+class QuestionCardCache:
+    def __init__(self, header_font, question_font, option_font, screen_width, background=None, prefetch=True):
+        self.header_font = header_font
+        self.question_font = question_font
+        self.option_font = option_font
+        self.screen_width = screen_width
+        self.background = background
+        # Without prefetch only the current question's card is kept in memory
+        self.prefetch_enabled = prefetch
+        self.cards = {}
+        self.pending = []
+
+    def render_card(self, questions, index, difficulty):
+        question = questions[index]
+        line_height = self.option_font.get_linesize()
+
+        pieces = []
+
+        # Draw question number and difficulty
+        header_text = f"Question {index + 1}/{len(questions)} - {difficulty}"
+        pieces.append((_prepare(self.header_font.render(header_text, True, BLACK)), (50, 50)))
+
+        # Draw question, wrapped and centred around the original question line
+        question_lines = wrap_text(self.question_font, question["question"], self.screen_width - 100)
+        question_height = self.question_font.get_linesize()
+        y = 200 - len(question_lines) * question_height // 2
+        for line in question_lines:
+            line_surface = _prepare(self.question_font.render(line, True, BLACK))
+            pieces.append((line_surface, line_surface.get_rect(midtop=(self.screen_width//2, y)).topleft))
+            y += question_height
+
+        # Draw options as opaque tiles, with the background showing in the rounded corners
+        option_rects = []
+        option_labels = []
+        top = 300
+        for i, option in enumerate(question["options"]):
+            lines = wrap_text(self.option_font, f"{chr(65+i)}. {option}", 560)
+            height = max(60, len(lines) * line_height + 12)
+            rect = pygame.Rect(self.screen_width//2 - 300, top, 600, height)
+            top += height + 20
+
+            tile = pygame.Surface(rect.size)
+            if self.background is not None:
+                tile.blit(self.background, (0, 0), rect)
+            local_rect = tile.get_rect()
+            pygame.draw.rect(tile, WHITE, local_rect, border_radius=10)
+            pygame.draw.rect(tile, BLACK, local_rect, 2, border_radius=10)
+
+            label = pygame.Surface((560, len(lines) * line_height), pygame.SRCALPHA)
+            for j, line in enumerate(lines):
+                label.blit(self.option_font.render(line, True, BLACK), (0, j * line_height))
+            tile.blit(label, label.get_rect(midleft=(20, local_rect.centery)))
+
+            pieces.append((_prepare(tile), rect.topleft))
+            option_rects.append(rect)
+            option_labels.append(_prepare(label))
+
+        return QuestionCard(pieces, option_rects, option_labels)
+
+    def get(self, questions, index, difficulty):
+        if index not in self.cards:
+            self.cards[index] = self.render_card(questions, index, difficulty)
+
+        # Drop cards for questions that have already been answered
+        for stale in [i for i in self.cards if i < index]:
+            del self.cards[stale]
+        return self.cards[index]
+
+    def prefetch(self, questions, index, difficulty):
+        if self.prefetch_enabled and index < len(questions) and index not in self.cards and \
+                all(pending_index != index for _, pending_index, _ in self.pending):
+            self.pending.append((questions, index, difficulty))
+
+    def render_pending(self):
+        # Called once per frame after drawing; renders at most one card
+        while self.pending:
+            questions, index, difficulty = self.pending.pop(0)
+            if index not in self.cards:
+                self.cards[index] = self.render_card(questions, index, difficulty)
+                break
+
+    def clear(self):
+        self.cards = {}
+        self.pending = []
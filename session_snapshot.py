@@ -0,0 +1,134 @@
+"""
+This file contains the session snapshot format used to resume a game.
+A snapshot is a small struct-packed record (scores, progress, game code and the
+question order as indexes into the question bank) with a CRC32 trailer. The
+same bytes can be written to disk for crash recovery or sent to another worker
+process to move a room.
+"""
+
+import glob
+import os
+import struct
+import threading
+import zlib
+from collections import namedtuple
+
+from matchmaking import CODE_DIGITS
+from protocol import DIFFICULTIES
+
+MAGIC = b"AWSQ"
+VERSION = 1
+
+# magic, version, difficulty, multiplayer, current question, score,
+# opponent score, game code, question count
+HEADER = struct.Struct("<4sBBBBIIIB")
+CHECKSUM = struct.Struct("<I")
+NO_CODE = 0xFFFFFFFF
+
+SessionState = namedtuple(
+    "SessionState",
+    "difficulty is_multiplayer current_question score opponent_score game_code question_order",
+)
+
+
+def encode_session(session):
+    code = int(session.game_code) if session.game_code else NO_CODE
+    record = HEADER.pack(
+        MAGIC, VERSION, DIFFICULTIES.index(session.difficulty), int(session.is_multiplayer),
+        session.current_question, session.score, session.opponent_score, code,
+        len(session.question_order),
+    ) + bytes(session.question_order)
+    return record + CHECKSUM.pack(zlib.crc32(record))
+
+
+def decode_session(data):
+    view = memoryview(data)
+    if len(view) < HEADER.size + CHECKSUM.size:
+        raise ValueError("Snapshot is truncated")
+    (magic, version, difficulty, is_multiplayer, current_question, score,
+     opponent_score, code, count) = HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a session snapshot")
+    end = HEADER.size + count
+    if len(view) != end + CHECKSUM.size:
+        raise ValueError("Snapshot is truncated")
+    if CHECKSUM.unpack_from(view, end)[0] != zlib.crc32(view[:end]):
+        raise ValueError("Snapshot checksum mismatch")
+
+    return SessionState(
+        DIFFICULTIES[difficulty], bool(is_multiplayer), current_question, score, opponent_score,
+        "" if code == NO_CODE else str(code).zfill(CODE_DIGITS), list(view[HEADER.size:end]),
+    )
+
+
+def write_atomic(path, data):
+    # Write next to the target and rename over it so readers never see a partial file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def load_session(path):
+    """Return the saved SessionState, or None if there is no usable snapshot"""
+    try:
+        with open(path, "rb") as f:
+            return decode_session(f.read())
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class SnapshotWriter:
+    """Writes snapshots on a background thread so saving never blocks a frame"""
+
+    def __init__(self, path):
+        self.path = path
+        # Each kiosk has its own snapshot path, so leftover temp files for it
+        # can only come from an earlier process that died mid-write
+        for temp_path in glob.glob(f"{glob.escape(path)}.*.tmp"):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        self.pending = None
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def save(self, session):
+        with self.condition:
+            # Only the latest snapshot matters; older unwritten ones are replaced
+            self.pending = encode_session(session)
+            self.condition.notify()
+
+    def discard(self):
+        with self.condition:
+            self.pending = b""
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                data, self.pending = self.pending, None
+
+            try:
+                if data:
+                    write_atomic(self.path, data)
+                elif os.path.exists(self.path):
+                    os.remove(self.path)
+            except OSError:
+                pass
+
+    def close(self):
+        """Finish any pending write and stop the writer thread"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
@@ -0,0 +1,268 @@
+"""
+This file contains the spectator mode for broadcasting a live match.
+A room's SpectatorHub collects state deltas (current question, scores and
+answer-lock events), coalesces them into one packet per tick and fans the same
+packet out to every read-only spectator. Slow spectators are resynced with a
+keyframe instead of queueing packets without limit.
+"""
+
+import time
+from collections import deque
+
+import protocol
+
+
+class SpectatorConnection:
+    def __init__(self, max_pending=8):
+        self.max_pending = max_pending
+        self.outbox = deque()
+        self.needs_keyframe = True
+        self.dropped = 0
+
+    def send(self, packet):
+        # Back-pressure: a spectator that falls too far behind loses its queued
+        # deltas and gets a full keyframe on the next tick instead
+        if len(self.outbox) >= self.max_pending:
+            self.dropped += len(self.outbox)
+            self.outbox.clear()
+            self.needs_keyframe = True
+            return False
+        self.outbox.append(packet)
+        return True
+
+    def receive(self):
+        """Return all queued packets and empty the outbox"""
+        packets = list(self.outbox)
+        self.outbox.clear()
+        return packets
+
+
+class SpectatorHub:
+    def __init__(self, code, difficulty, total_questions):
+        self.code = code
+        self.difficulty = difficulty
+        self.total_questions = total_questions
+        self.spectators = []
+
+        # Latest room state, used to build keyframes; locks are kept for every
+        # question so a resynced spectator still sees who answered earlier ones
+        self.question = None
+        self.score = None
+        self.locked = set()
+
+        # Deltas collected since the last tick
+        self.pending_question = None
+        self.pending_score = None
+        self.pending_locks = []
+
+    def subscribe(self, max_pending=8):
+        connection = SpectatorConnection(max_pending)
+        self.spectators.append(connection)
+        return connection
+
+    def unsubscribe(self, connection):
+        self.spectators.remove(connection)
+
+    def set_question(self, number, bank_index):
+        self.question = protocol.Question(self.code, number, self.total_questions, bank_index)
+        self.pending_question = self.question
+
+    def set_scores(self, score, opponent_score):
+        # Only the latest scores in a tick are sent
+        self.score = protocol.Score(self.code, score, opponent_score)
+        self.pending_score = self.score
+
+    def lock_answer(self, player, question):
+        if (player, question) not in self.locked:
+            self.locked.add((player, question))
+            self.pending_locks.append(protocol.AnswerLocked(self.code, player, question))
+
+    def keyframe(self):
+        messages = [protocol.RoomReady(self.code, self.difficulty, self.total_questions)]
+        if self.question is not None:
+            messages.append(self.question)
+        if self.score is not None:
+            messages.append(self.score)
+        for player, question in sorted(self.locked):
+            messages.append(protocol.AnswerLocked(self.code, player, question))
+        return protocol.encode_batch(messages)
+
+    def flush(self):
+        """Send this tick's coalesced deltas to every spectator"""
+        # Locks go first: the last answer to a question and the move to the next
+        # question usually land in the same tick
+        messages = list(self.pending_locks)
+        if self.pending_question is not None:
+            messages.append(self.pending_question)
+        if self.pending_score is not None:
+            messages.append(self.pending_score)
+        self.pending_question = None
+        self.pending_score = None
+        self.pending_locks = []
+
+        # Nothing is encoded while nobody is watching; keyframes cover late joiners
+        if not self.spectators:
+            return
+
+        delta = protocol.encode_batch(messages) if messages else None
+        keyframe = None
+        for connection in self.spectators:
+            if connection.needs_keyframe:
+                if keyframe is None:
+                    keyframe = self.keyframe()
+                # The keyframe already includes this tick's deltas
+                connection.outbox.clear()
+                connection.outbox.append(keyframe)
+                connection.needs_keyframe = False
+            elif delta is not None:
+                connection.send(delta)
+
+    def close(self):
+        """Send any pending deltas, then tell every spectator the room closed"""
+        self.flush()
+        packet = protocol.encode(protocol.RoomClosed(self.code))
+        keyframe = None
+        for connection in self.spectators:
+            # The closing message skips back-pressure, since the hub stops sending
+            # afterwards; a backed-up spectator gets one keyframe with the final state
+            if len(connection.outbox) >= connection.max_pending:
+                if keyframe is None:
+                    keyframe = self.keyframe()
+                connection.dropped += len(connection.outbox)
+                connection.outbox.clear()
+                connection.outbox.append(keyframe)
+            connection.outbox.append(packet)
+        self.spectators = []
+
+
+class SpectatorClient:
+    """Headless read-only client that rebuilds the playing screen from packets"""
+
+    def __init__(self, all_questions):
+        self.all_questions = all_questions
+        self.code = ""
+        self.difficulty = ""
+        self.questions = []
+        self.current_question = 0
+        self.score = 0
+        self.opponent_score = 0
+        # Players who locked an answer, per question and for the current question
+        self.answer_locks = {}
+        self.locked = set()
+        self.closed = False
+
+    def apply(self, packet):
+        for message in protocol.decode(packet):
+            if isinstance(message, protocol.RoomReady):
+                self.code = message.code
+                self.difficulty = message.difficulty
+                self.questions = [None] * message.questions
+                self.answer_locks = {}
+                self.locked = set()
+            elif isinstance(message, protocol.Question):
+                self.current_question = message.number
+                self.questions[message.number] = self.all_questions[self.difficulty][message.bank_index]
+                self.locked = set(self.answer_locks.get(message.number, ()))
+            elif isinstance(message, protocol.Score):
+                self.score = message.score
+                self.opponent_score = message.opponent_score
+            elif isinstance(message, protocol.AnswerLocked):
+                self.answer_locks.setdefault(message.question, set()).add(message.player)
+                if message.question == self.current_question:
+                    self.locked.add(message.player)
+            elif isinstance(message, protocol.RoomClosed):
+                self.closed = True
+
+    def poll(self, connection):
+        for packet in connection.receive():
+            self.apply(packet)
+
+    def draw(self, surface, card_cache, text_font):
+        """Draw the same view as AWSCloudQuest.draw_playing onto surface"""
+        if self.current_question >= len(self.questions) or self.questions[self.current_question] is None:
+            return
+        card = card_cache.get(self.questions, self.current_question, self.difficulty)
+        card.draw(surface)
+
+        score_surface = text_font.render(f"Player Score: {self.score}", True, (0, 0, 0))
+        surface.blit(score_surface, score_surface.get_rect(topleft=(50, 100)))
+        opponent_surface = text_font.render(f"Opponent Score: {self.opponent_score}", True, (0, 0, 0))
+        surface.blit(opponent_surface, opponent_surface.get_rect(topright=(surface.get_width() - 50, 100)))
+
+
+def check_answer_sequence(questions=5):
+    """Replay the hub calls AWSCloudQuest makes per answer and check what spectators see"""
+    hub = SpectatorHub("042137", "Hard", questions)
+    live = hub.subscribe()
+    live_client = SpectatorClient({"Hard": [None] * questions})
+    hub.set_scores(0, 0)
+    hub.set_question(0, 0)
+    hub.flush()
+    live_client.poll(live)
+
+    for number in range(questions):
+        # Same order as handle_playing_click: both players lock, then scores
+        # and the next question are published, all before the next flush
+        hub.lock_answer(0, number)
+        hub.lock_answer(1, number)
+        hub.set_scores(100 * (number + 1), 50 * (number + 1))
+        if number + 1 < questions:
+            hub.set_question(number + 1, number + 1)
+        hub.flush()
+        live_client.poll(live)
+        assert live_client.answer_locks.get(number) == {0, 1}, live_client.answer_locks
+
+    # A spectator joining late is resynced from a keyframe and sees the same locks
+    late = hub.subscribe()
+    late_client = SpectatorClient({"Hard": [None] * questions})
+    hub.flush()
+    late_client.poll(late)
+    assert late_client.answer_locks == live_client.answer_locks, late_client.answer_locks
+
+
+def benchmark(spectators=1000, ticks=600):
+    """Measure per-tick fan-out cost to many local spectators"""
+    hub = SpectatorHub("042137", "Hard", 5)
+    connections = [hub.subscribe() for _ in range(spectators)]
+    clients = [SpectatorClient({"Hard": [None] * 5}) for _ in range(spectators)]
+    # Every tenth spectator only reads once a second to exercise back-pressure
+    slow = set(range(0, spectators, 10))
+
+    flush_times = []
+    drain_times = []
+    score = opponent_score = 0
+    for tick in range(ticks):
+        if tick % 120 == 0:
+            hub.set_question(tick // 120 % 5, tick // 120 % 5)
+        if tick % 30 == 0:
+            hub.lock_answer(tick // 30 % 2, tick // 120 % 5)
+        if tick % 3 == 0:
+            score += 10
+            opponent_score += 7
+            hub.set_scores(score, opponent_score)
+
+        start = time.perf_counter()
+        hub.flush()
+        flush_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i, (connection, client) in enumerate(zip(connections, clients)):
+            if i not in slow or tick % 60 == 59:
+                client.poll(connection)
+        drain_times.append(time.perf_counter() - start)
+
+    assert all(client.score == score for client in clients)
+    flush_times.sort()
+    drain_times.sort()
+    dropped = sum(connection.dropped for connection in connections)
+    print(f"{spectators} spectators, {ticks} ticks")
+    print(f"fan-out per tick   p50 {flush_times[ticks // 2] * 1e3:6.3f} ms   "
+          f"p99 {flush_times[int(ticks * 0.99)] * 1e3:6.3f} ms")
+    print(f"client decode/tick p50 {drain_times[ticks // 2] * 1e3:6.3f} ms   "
+          f"p99 {drain_times[int(ticks * 0.99)] * 1e3:6.3f} ms")
+    print(f"packets dropped for slow spectators: {dropped}")
+
+
+if __name__ == "__main__":
+    check_answer_sequence()
+    benchmark()
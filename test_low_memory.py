@@ -0,0 +1,26 @@
+"""
+This file contains the memory check for low-memory mode. Each mode is measured
+in its own subprocess with several game instances, idle and mid-game, and
+low-memory mode must stay below half of the default mode's RSS and PSS.
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("pygame")
+
+import low_memory
+
+MAX_RATIO = 0.5
+
+
+@pytest.mark.skipif(not os.path.exists(low_memory.SMAPS_ROLLUP),
+                    reason="current RSS/PSS needs /proc/self/smaps_rollup")
+def test_low_memory_mode_uses_less_than_half_the_memory():
+    results = low_memory.measure(instances=8)
+    columns = ("RSS idle", "PSS idle", "RSS playing", "PSS playing")
+    for column, default, low in zip(columns, results[False], results[True]):
+        assert default > 0 and low >= 0, f"{column} was not measured"
+        assert low <= default * MAX_RATIO, (
+            f"{column}: low-memory {low:.0f} KiB/instance vs default {default:.0f} KiB/instance")